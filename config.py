@@ -3,7 +3,12 @@ Configuration settings for NexToken
 """
 
 import os
-from typing import Optional
+import functools
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
+
+# Deployment environment, read once at import
+NEXTOKEN_ENV = os.getenv("NEXTOKEN_ENV", "development")
 
 
 class Config:
@@ -36,22 +41,24 @@ class Config:
     LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     
     @classmethod
-    def get_redis_config(cls) -> dict:
-        """Get Redis configuration"""
-        return {
+    @functools.lru_cache(maxsize=None)
+    def get_redis_config(cls) -> Mapping[str, Any]:
+        """Get Redis configuration (built once per config class, read-only)"""
+        return MappingProxyType({
             "url": cls.REDIS_URL,
             "db": cls.REDIS_DB,
-        }
+        })
     
     @classmethod
-    def get_cors_config(cls) -> dict:
-        """Get CORS configuration"""
-        return {
-            "allow_origins": cls.ALLOWED_ORIGINS,
+    @functools.lru_cache(maxsize=None)
+    def get_cors_config(cls) -> Mapping[str, Any]:
+        """Get CORS configuration (built once per config class, read-only)"""
+        return MappingProxyType({
+            "allow_origins": tuple(cls.ALLOWED_ORIGINS),
             "allow_credentials": True,
-            "allow_methods": ["*"],
-            "allow_headers": ["*"],
-        }
+            "allow_methods": ("*",),
+            "allow_headers": ("*",),
+        })
 
 
 # Development configuration
@@ -88,6 +95,6 @@ config_map = {
 def get_config(environment: Optional[str] = None) -> Config:
     """Get configuration for the specified environment"""
     if environment is None:
-        environment = os.getenv("NEXTOKEN_ENV", "development")
+        environment = NEXTOKEN_ENV
     
     return config_map.get(environment, DevelopmentConfig) 
\ No newline at end of file
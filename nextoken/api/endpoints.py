@@ -2,84 +2,222 @@
 FastAPI endpoints for NexToken
 """
 
-from fastapi import APIRouter, HTTPException
-from datetime import datetime
+import email.message
+import msgspec
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from typing import Any, Dict, Optional, Type
 
 from ..models.schemas import (
     TokenIssueRequest,
     TokenIssueResponse,
+    TokenIssueBulkRequest,
+    TokenIssueBulkResponse,
     TokenVerifyRequest,
     TokenVerifyResponse,
+    TokenVerifyBulkRequest,
+    TokenVerifyBulkResponse,
     TokenRevokeRequest,
     TokenRevokeResponse,
     HealthResponse
 )
-from ..core.token import nextoken
+from ..models import responses_fast as fast
+from ..core.token import nextoken, unix_now
 from ..core.storage import token_storage
 from .. import __version__
 
 router = APIRouter()
 
+_encode_json = msgspec.json.Encoder().encode
 
-@router.post("/issue", response_model=TokenIssueResponse)
-async def issue_token(request: TokenIssueRequest):
+
+def json_response(content: msgspec.Struct) -> Response:
+    """Encode a response struct with msgspec, bypassing FastAPI's encoder"""
+    return Response(content=_encode_json(content), media_type="application/json")
+
+
+def _inline_refs(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Resolve local $defs references so a schema can stand alone in an operation"""
+    defs = schema.pop("$defs", {})
+    
+    def resolve(node: Any) -> Any:
+        if isinstance(node, dict):
+            if "$ref" in node:
+                return resolve(defs[node["$ref"].rsplit("/", 1)[-1]])
+            return {key: resolve(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [resolve(value) for value in node]
+        return node
+    
+    return resolve(schema)
+
+
+def _body_error(error: Dict[str, Any]) -> Dict[str, Any]:
+    """Locate a validation error under "body", as FastAPI's own body parsing does"""
+    error = {**error, "loc": ("body", *error["loc"])}
+    if isinstance(error.get("input"), bytes):
+        # The input is the raw request body, which may not be UTF-8 and should
+        # not be echoed back; FastAPI reports an empty input here too
+        error["input"] = {}
+    return error
+
+
+def _is_json_content_type(content_type: Optional[str]) -> bool:
+    """FastAPI's rule for reading a body as JSON: no content type, or application/json or */*+json"""
+    if not content_type:
+        return True
+    message = email.message.Message()
+    message["content-type"] = content_type
+    if message.get_content_maintype() != "application":
+        return False
+    subtype = message.get_content_subtype()
+    return subtype == "json" or subtype.endswith("+json")
+
+
+def json_body(model: Type[BaseModel]) -> Any:
+    """
+    Dependency that validates the raw request body with a cached TypeAdapter
+    
+    Parsing goes straight from JSON bytes to the model in pydantic-core,
+    skipping the intermediate dict FastAPI would otherwise build.
+    """
+    adapter = TypeAdapter(model)
+    
+    async def parse_body(request: Request) -> BaseModel:
+        body = await request.body()
+        try:
+            if _is_json_content_type(request.headers.get("content-type")):
+                return adapter.validate_json(body)
+            # Other content types are never read as JSON, so cross-site "simple"
+            # text/plain POSTs fail validation (CVE-2021-32677)
+            return adapter.validate_python(body)
+        except ValidationError as e:
+            raise RequestValidationError([_body_error(error) for error in e.errors(include_url=False)])
+    
+    return Depends(parse_body)
+
+
+def json_body_docs(model: Type[BaseModel]) -> Dict[str, Any]:
+    """OpenAPI requestBody for a route that reads its body through json_body"""
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": _inline_refs(model.model_json_schema())}}
+        }
+    }
+
+
+# Shared base for failed verifications; only the error message differs
+_INVALID_VERIFY_RESPONSE = fast.TokenVerifyResponse(valid=False)
+
+
+def verify_result_struct(result: Dict[str, Any]) -> fast.TokenVerifyResponse:
+    """Convert a verification result dict into its response struct"""
+    if result["valid"]:
+        return fast.TokenVerifyResponse(
+            valid=True,
+            user_id=result.get("user_id"),
+            email=result.get("email"),
+            custom_claims=result.get("custom_claims"),
+            expires_at=result.get("expires_at"),
+            issued_at=result.get("issued_at")
+        )
+    return msgspec.structs.replace(
+        _INVALID_VERIFY_RESPONSE,
+        error=result.get("error", "Unknown error")
+    )
+
+
+@router.post("/issue", response_model=TokenIssueResponse,
+             openapi_extra=json_body_docs(TokenIssueRequest))
+async def issue_token(request: TokenIssueRequest = json_body(TokenIssueRequest)):
     """Issue a new NexToken"""
     try:
-        token_string, token_id = nextoken.create_token(
+        # Read the clock once and share it with token creation
+        now = unix_now()
+        
+        token_string, token_id = await nextoken.create_token(
             user_id=request.user_id,
             email=request.email,
             expires_in=request.expires_in,
-            custom_claims=request.custom_claims
-        )
-        
-        # Calculate expiration datetime
-        expires_at = datetime.fromtimestamp(
-            datetime.now().timestamp() + request.expires_in
+            custom_claims=request.custom_claims,
+            now=now
         )
         
-        return TokenIssueResponse(
+        return json_response(fast.TokenIssueResponse(
             token=token_string,
             token_id=token_id,
-            expires_at=expires_at
-        )
+            expires_at=now + request.expires_in
+        ))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to issue token: {str(e)}")
 
 
-@router.post("/verify", response_model=TokenVerifyResponse)
-async def verify_token(request: TokenVerifyRequest):
-    """Verify a NexToken"""
+@router.post("/issue_bulk", response_model=TokenIssueBulkResponse,
+             openapi_extra=json_body_docs(TokenIssueBulkRequest))
+async def issue_tokens_bulk(request: TokenIssueBulkRequest = json_body(TokenIssueBulkRequest)):
+    """Issue a batch of NexTokens"""
     try:
-        result = nextoken.verify_token(request.token)
+        # Read the clock once and share it across the batch
+        now = unix_now()
         
-        if result["valid"]:
-            return TokenVerifyResponse(
-                valid=True,
-                user_id=result.get("user_id"),
-                email=result.get("email"),
-                custom_claims=result.get("custom_claims"),
-                expires_at=result.get("expires_at"),
-                issued_at=result.get("issued_at")
-            )
-        else:
-            return TokenVerifyResponse(
-                valid=False,
-                error=result.get("error", "Unknown error")
-            )
+        # Validated fields live in each model's __dict__; reading it directly
+        # avoids a model_dump() copy per item
+        issued = await nextoken.create_tokens_bulk(
+            [vars(item) for item in request.tokens],
+            now=now
+        )
+        
+        return json_response(fast.TokenIssueBulkResponse(
+            tokens=[
+                fast.TokenIssueResponse(
+                    token=token_string,
+                    token_id=token_id,
+                    expires_at=now + item.expires_in
+                )
+                for (token_string, token_id), item in zip(issued, request.tokens)
+            ]
+        ))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to issue tokens: {str(e)}")
+
+
+@router.post("/verify", response_model=TokenVerifyResponse,
+             openapi_extra=json_body_docs(TokenVerifyRequest))
+async def verify_token(request: TokenVerifyRequest = json_body(TokenVerifyRequest)):
+    """Verify a NexToken"""
+    try:
+        result = await nextoken.verify_token(request.token)
+        return json_response(verify_result_struct(result))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to verify token: {str(e)}")
 
 
-@router.post("/revoke", response_model=TokenRevokeResponse)
-async def revoke_token(request: TokenRevokeRequest):
+@router.post("/verify_bulk", response_model=TokenVerifyBulkResponse,
+             openapi_extra=json_body_docs(TokenVerifyBulkRequest))
+async def verify_tokens_bulk(request: TokenVerifyBulkRequest = json_body(TokenVerifyBulkRequest)):
+    """Verify a batch of NexTokens"""
+    try:
+        results = await nextoken.verify_tokens(request.tokens)
+        return json_response(fast.TokenVerifyBulkResponse(
+            results=[verify_result_struct(result) for result in results]
+        ))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to verify tokens: {str(e)}")
+
+
+@router.post("/revoke", response_model=TokenRevokeResponse,
+             openapi_extra=json_body_docs(TokenRevokeRequest))
+async def revoke_token(request: TokenRevokeRequest = json_body(TokenRevokeRequest)):
     """Revoke a NexToken"""
     try:
-        result = nextoken.revoke_token(request.token)
+        result = await nextoken.revoke_token(request.token)
         
-        return TokenRevokeResponse(
+        return json_response(fast.TokenRevokeResponse(
             success=result["success"],
             message=result["message"]
-        )
+        ))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to revoke token: {str(e)}")
 
@@ -87,35 +225,36 @@ async def revoke_token(request: TokenRevokeRequest):
 @router.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
+    timestamp = unix_now()
     try:
         # Check Redis connection
-        redis_healthy = token_storage.health_check()
+        redis_healthy = await token_storage.health_check()
         
         status = "healthy" if redis_healthy else "degraded"
         
-        return HealthResponse(
+        return json_response(fast.HealthResponse(
             status=status,
             version=__version__,
-            timestamp=datetime.now()
-        )
+            timestamp=timestamp
+        ))
     except Exception as e:
-        return HealthResponse(
+        return json_response(fast.HealthResponse(
             status="unhealthy",
             version=__version__,
-            timestamp=datetime.now()
-        )
+            timestamp=timestamp
+        ))
 
 
 @router.get("/stats")
 async def get_stats():
     """Get token statistics"""
     try:
-        stats = token_storage.get_token_stats()
+        stats = await token_storage.get_token_stats()
         return {
             "active_tokens": stats["active_tokens"],
             "revoked_tokens": stats["revoked_tokens"],
             "total_tokens": stats["total_tokens"],
-            "timestamp": datetime.now().isoformat()
+            "timestamp": unix_now()
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get stats: {str(e)}") 
\ No newline at end of file
@@ -4,78 +4,96 @@ Cryptographic operations for NexToken
 
 import os
 import base64
+import hashlib
+from collections import OrderedDict
 from typing import Tuple, Optional
-from cryptography.hazmat.primitives import serialization, hashes
-from cryptography.hazmat.primitives.asymmetric import ed25519
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.backends import default_backend
+from nacl.signing import SigningKey
+from nacl.exceptions import BadSignatureError
+from nacl.bindings import (
+    crypto_aead_xchacha20poly1305_ietf_decrypt,
+    crypto_aead_xchacha20poly1305_ietf_encrypt,
+    crypto_aead_xchacha20poly1305_ietf_KEYBYTES,
+    crypto_aead_xchacha20poly1305_ietf_NPUBBYTES,
+)
+
+# Maximum number of verified (data digest, signature) pairs to remember
+VERIFY_CACHE_SIZE = 65536
 
 
 class CryptoManager:
     """Manages cryptographic operations for NexToken"""
     
     def __init__(self):
-        # Generate Ed25519 key pair for token signing
-        self.private_key = ed25519.Ed25519PrivateKey.generate()
-        self.public_key = self.private_key.public_key()
+        # Generate Ed25519 key pair for token signing (libsodium)
+        self._signing_key = SigningKey.generate()
+        self._verify_key = self._signing_key.verify_key
+        
+        # Recently verified signatures, keyed by blake2b(data) || signature
+        self._verified: "OrderedDict[bytes, None]" = OrderedDict()
         
-        # Generate AES key for encrypting sensitive payload fields
-        self.aes_key = os.urandom(32)  # 256-bit key
-        self.aes_iv = os.urandom(16)   # 128-bit IV
+        # Generate key for encrypting sensitive payload fields (XChaCha20-Poly1305)
+        self.field_key = os.urandom(crypto_aead_xchacha20poly1305_ietf_KEYBYTES)  # 256-bit key
     
     def get_public_key_bytes(self) -> bytes:
         """Get the public key in bytes format"""
-        return self.public_key.public_bytes(
-            encoding=serialization.Encoding.Raw,
-            format=serialization.PublicFormat.Raw
-        )
+        return bytes(self._verify_key)
     
     def sign_data(self, data: bytes) -> bytes:
         """Sign data using Ed25519"""
-        return self.private_key.sign(data)
+        return self._signing_key.sign(data).signature
     
     def verify_signature(self, data: bytes, signature: bytes) -> bool:
         """Verify Ed25519 signature"""
-        try:
-            self.public_key.verify(signature, data)
+        cache_key = hashlib.blake2b(data, digest_size=32).digest() + signature
+        verified = self._verified
+        if cache_key in verified:
+            try:
+                verified.move_to_end(cache_key)
+            except KeyError:
+                pass
             return True
-        except Exception:
+        
+        try:
+            self._verify_key.verify(data, signature)
+        except (BadSignatureError, ValueError, TypeError):
             return False
+        
+        # Only successful verifications are cached so forged input cannot evict them
+        verified[cache_key] = None
+        if len(verified) > VERIFY_CACHE_SIZE:
+            try:
+                verified.popitem(last=False)
+            except KeyError:
+                pass
+        return True
     
     def encrypt_field(self, plaintext: str) -> str:
-        """Encrypt a field using AES-256-CFB"""
+        """Encrypt a field using XChaCha20-Poly1305"""
         if not plaintext:
             return ""
         
-        cipher = Cipher(
-            algorithms.AES(self.aes_key),
-            modes.CFB(self.aes_iv),
-            backend=default_backend()
+        # 192-bit random nonce, unique per call
+        nonce = os.urandom(crypto_aead_xchacha20poly1305_ietf_NPUBBYTES)
+        ciphertext = crypto_aead_xchacha20poly1305_ietf_encrypt(
+            plaintext.encode('utf-8'), None, nonce, self.field_key
         )
-        encryptor = cipher.encryptor()
         
-        plaintext_bytes = plaintext.encode('utf-8')
-        ciphertext = encryptor.update(plaintext_bytes) + encryptor.finalize()
-        
-        # Return base64 encoded ciphertext
-        return base64.b64encode(ciphertext).decode('utf-8')
+        # Return base64 encoded nonce || ciphertext || tag
+        return base64.urlsafe_b64encode(nonce + ciphertext).decode('utf-8')
     
     def decrypt_field(self, encrypted_text: str) -> str:
-        """Decrypt a field using AES-256-CFB"""
+        """Decrypt a field using XChaCha20-Poly1305"""
         if not encrypted_text:
             return ""
         
         try:
-            ciphertext = base64.b64decode(encrypted_text.encode('utf-8'))
+            data = base64.urlsafe_b64decode(encrypted_text.encode('utf-8'))
+            nonce_size = crypto_aead_xchacha20poly1305_ietf_NPUBBYTES
+            nonce, ciphertext = data[:nonce_size], data[nonce_size:]
             
-            cipher = Cipher(
-                algorithms.AES(self.aes_key),
-                modes.CFB(self.aes_iv),
-                backend=default_backend()
+            plaintext_bytes = crypto_aead_xchacha20poly1305_ietf_decrypt(
+                ciphertext, None, nonce, self.field_key
             )
-            decryptor = cipher.decryptor()
-            
-            plaintext_bytes = decryptor.update(ciphertext) + decryptor.finalize()
             return plaintext_bytes.decode('utf-8')
         except Exception:
             return ""
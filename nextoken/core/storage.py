@@ -2,101 +2,272 @@
 Redis storage operations for NexToken
 """
 
-import redis
-import json
-from typing import Optional, Dict, Any
-from datetime import datetime, timedelta
+import time
+import asyncio
+import logging
+import redis.asyncio as aredis
+import msgspec
+from rbloom import Bloom
+from typing import Optional, Dict, Any, List, Tuple
+
+# Sizing for the in-process filter of revoked token IDs
+REVOKED_FILTER_CAPACITY = 1_000_000
+REVOKED_FILTER_ERROR_RATE = 0.001
+
+# Seconds to wait after a failed filter load before trying again; checks use
+# plain Redis lookups in the meantime
+REVOKED_FILTER_RETRY_INTERVAL = 5.0
+
+# Upper bound on pooled Redis connections; callers wait for a free one
+REDIS_MAX_CONNECTIONS = 64
+
+logger = logging.getLogger(__name__)
 
 
 class TokenStorage:
     """Manages token storage and revocation status using Redis"""
     
     def __init__(self, redis_url: str = "redis://localhost:6379"):
-        """Initialize Redis connection"""
-        self.redis_client = redis.from_url(redis_url, decode_responses=True)
+        """Initialize Redis connection pool (connections are opened lazily)"""
+        self._pool = aredis.BlockingConnectionPool.from_url(
+            redis_url,
+            decode_responses=True,
+            max_connections=REDIS_MAX_CONNECTIONS
+        )
+        self.redis_client = aredis.Redis(connection_pool=self._pool)
         self.token_prefix = "nextoken:"
         self.revoked_prefix = "nextoken:revoked:"
+        
+        # Encoded once; keys are built by bytes concatenation and sent as-is
+        self._token_prefix_b = self.token_prefix.encode()
+        self._revoked_prefix_b = self.revoked_prefix.encode()
+        
+        # Sorted-set indexes of token IDs scored by expiry, used for O(log N) stats
+        self.active_index = "nextoken:index:active"
+        self.revoked_index = "nextoken:index:revoked"
+        self.revoked_retention = 30 * 24 * 3600  # 30 days
+        
+        # Local Bloom filter of revoked token IDs so the common "not revoked"
+        # answer needs no Redis round trip. Workers keep it in sync through
+        # pub/sub; until it has been loaded, every check goes to Redis.
+        self.revoked_channel = "nextoken:revoked:channel"
+        self._revoked_filter = Bloom(REVOKED_FILTER_CAPACITY, REVOKED_FILTER_ERROR_RATE)
+        self._revoked_filter_ready = False
+        # Created on first load so it binds to the running loop (Python < 3.10)
+        self._revoked_filter_lock: Optional[asyncio.Lock] = None
+        self._revoked_filter_retry_at = 0.0
+        self._revoked_listener = None
     
-    def store_token_metadata(self, token_id: str, metadata: Dict[str, Any], expires_in: int) -> bool:
+    async def store_token_metadata(self, token_id: str, metadata: Dict[str, Any], expires_in: int) -> bool:
         """Store token metadata in Redis"""
         try:
-            key = f"{self.token_prefix}{token_id}"
-            metadata_json = json.dumps(metadata)
+            key = self._token_prefix_b + token_id.encode()
+            metadata_json = msgspec.json.encode(metadata)
+            now = time.time()
+            
+            # Store with expiration and index the token for stats
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.setex(key, expires_in, metadata_json)
+            pipe.zadd(self.active_index, {token_id: now + expires_in})
+            pipe.zremrangebyscore(self.active_index, "-inf", now)
+            await pipe.execute()
+            return True
+        except Exception:
+            logger.exception("Error storing token metadata")
+            return False
+    
+    async def store_tokens_metadata(self, entries: List[Tuple[str, Dict[str, Any], int]]) -> bool:
+        """Store metadata for many tokens in one pipelined round trip"""
+        if not entries:
+            return True
+        
+        try:
+            token_prefix_b = self._token_prefix_b
+            encode = msgspec.json.encode
+            now = time.time()
+            
+            pipe = self.redis_client.pipeline(transaction=False)
+            setex = pipe.setex
+            for token_id, metadata, expires_in in entries:
+                setex(token_prefix_b + token_id.encode(), expires_in, encode(metadata))
             
-            # Store with expiration
-            self.redis_client.setex(key, expires_in, metadata_json)
+            # Index the tokens for stats
+            pipe.zadd(self.active_index, {
+                token_id: now + expires_in for token_id, _, expires_in in entries
+            })
+            pipe.zremrangebyscore(self.active_index, "-inf", now)
+            await pipe.execute()
             return True
-        except Exception as e:
-            print(f"Error storing token metadata: {e}")
+        except Exception:
+            logger.exception("Error storing token metadata")
             return False
     
-    def get_token_metadata(self, token_id: str) -> Optional[Dict[str, Any]]:
+    async def get_token_metadata(self, token_id: str) -> Optional[Dict[str, Any]]:
         """Retrieve token metadata from Redis"""
         try:
-            key = f"{self.token_prefix}{token_id}"
-            metadata_json = self.redis_client.get(key)
+            key = self._token_prefix_b + token_id.encode()
+            metadata_json = await self.redis_client.get(key)
             
             if metadata_json:
-                return json.loads(metadata_json)
+                return msgspec.json.decode(metadata_json)
             return None
-        except Exception as e:
-            print(f"Error retrieving token metadata: {e}")
+        except Exception:
+            logger.exception("Error retrieving token metadata")
             return None
     
-    def revoke_token(self, token_id: str) -> bool:
+    async def revoke_token(self, token_id: str) -> bool:
         """Mark a token as revoked"""
         try:
+            revoked_key = self._revoked_prefix_b + token_id.encode()
+            active_key = self._token_prefix_b + token_id.encode()
+            now = time.time()
+            
+            pipe = self.redis_client.pipeline(transaction=False)
+            
             # Store in revoked tokens with a long expiration (e.g., 30 days)
-            revoked_key = f"{self.revoked_prefix}{token_id}"
-            self.redis_client.setex(revoked_key, 30 * 24 * 3600, "revoked")
+            pipe.setex(revoked_key, self.revoked_retention, "revoked")
+            pipe.zadd(self.revoked_index, {token_id: now + self.revoked_retention})
+            pipe.zremrangebyscore(self.revoked_index, "-inf", now)
             
             # Remove from active tokens
-            active_key = f"{self.token_prefix}{token_id}"
-            self.redis_client.delete(active_key)
+            pipe.delete(active_key)
+            pipe.zrem(self.active_index, token_id)
             
+            # Tell other workers to add the ID to their filters
+            pipe.publish(self.revoked_channel, token_id)
+            
+            await pipe.execute()
+            self._revoked_filter.add(token_id)
             return True
-        except Exception as e:
-            print(f"Error revoking token: {e}")
+        except Exception:
+            logger.exception("Error revoking token")
             return False
     
-    def is_token_revoked(self, token_id: str) -> bool:
+    async def is_token_revoked(self, token_id: str) -> bool:
         """Check if a token is revoked"""
+        # Definitely not revoked if the warm filter has never seen the ID
+        if (self._revoked_filter_ready or await self._load_revoked_filter()) \
+                and token_id not in self._revoked_filter:
+            return False
+        
+        try:
+            revoked_key = self._revoked_prefix_b + token_id.encode()
+            return await self.redis_client.exists(revoked_key) > 0
+        except Exception:
+            logger.exception("Error checking token revocation")
+            return False
+    
+    async def are_tokens_revoked(self, token_ids: List[str]) -> List[bool]:
+        """Check revocation for many tokens with at most one MGET round trip"""
+        # IDs that are not strings cannot have been issued, so they are
+        # reported revoked and never reach the filter or Redis
+        revoked = [not isinstance(token_id, str) for token_id in token_ids]
+        candidates = [i for i, bad_id in enumerate(revoked) if not bad_id]
+        if self._revoked_filter_ready or await self._load_revoked_filter():
+            candidates = [i for i in candidates if token_ids[i] in self._revoked_filter]
+        
+        if not candidates:
+            return revoked
+        
         try:
-            revoked_key = f"{self.revoked_prefix}{token_id}"
-            return self.redis_client.exists(revoked_key) > 0
-        except Exception as e:
-            print(f"Error checking token revocation: {e}")
+            keys = [self._revoked_prefix_b + token_ids[i].encode() for i in candidates]
+            values = await self.redis_client.mget(keys)
+            for i, value in zip(candidates, values):
+                revoked[i] = value is not None
+        except Exception:
+            logger.exception("Error checking token revocation")
+        
+        return revoked
+    
+    async def _load_revoked_filter(self) -> bool:
+        """Populate the revoked-ID filter from Redis and subscribe to new revocations"""
+        if time.monotonic() < self._revoked_filter_retry_at:
             return False
+        if self._revoked_filter_lock is None:
+            self._revoked_filter_lock = asyncio.Lock()
+        
+        async with self._revoked_filter_lock:
+            if self._revoked_filter_ready:
+                return True
+            if time.monotonic() < self._revoked_filter_retry_at:
+                return False
+            
+            pubsub = None
+            try:
+                # Subscribe before loading so revocations made meanwhile are not missed
+                pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(self.revoked_channel)
+                
+                token_ids = await self.redis_client.zrangebyscore(
+                    self.revoked_index, time.time(), "+inf"
+                )
+                self._revoked_filter.update(token_ids)
+                
+                self._revoked_listener = asyncio.create_task(self._listen_for_revocations(pubsub))
+                self._revoked_filter_ready = True
+                return True
+            except Exception:
+                logger.exception("Error loading revoked token filter")
+                self._revoked_filter_retry_at = time.monotonic() + REVOKED_FILTER_RETRY_INTERVAL
+                if pubsub is not None:
+                    await pubsub.aclose()
+                return False
+    
+    async def _listen_for_revocations(self, pubsub: aredis.client.PubSub) -> None:
+        """Add token IDs revoked by any worker to the local filter"""
+        try:
+            async for message in pubsub.listen():
+                self._revoked_filter.add(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Error in revoked token listener")
+            self._revoked_filter_retry_at = time.monotonic() + REVOKED_FILTER_RETRY_INTERVAL
+        finally:
+            # Fall back to Redis lookups until the filter can be reloaded
+            self._revoked_filter_ready = False
+            await pubsub.aclose()
     
     def cleanup_expired_tokens(self) -> int:
         """Clean up expired tokens (Redis handles this automatically with TTL)"""
         # This is handled automatically by Redis TTL
         return 0
     
-    def get_token_stats(self) -> Dict[str, Any]:
+    async def get_token_stats(self) -> Dict[str, Any]:
         """Get token statistics"""
         try:
-            # Count active tokens
-            active_pattern = f"{self.token_prefix}*"
-            active_count = len(self.redis_client.keys(active_pattern))
-            
-            # Count revoked tokens
-            revoked_pattern = f"{self.revoked_prefix}*"
-            revoked_count = len(self.redis_client.keys(revoked_pattern))
+            # Count index entries that have not yet expired
+            now = time.time()
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.zcount(self.active_index, now, "+inf")
+            pipe.zcount(self.revoked_index, now, "+inf")
+            active_count, revoked_count = await pipe.execute()
             
             return {
                 "active_tokens": active_count,
                 "revoked_tokens": revoked_count,
                 "total_tokens": active_count + revoked_count
             }
-        except Exception as e:
-            print(f"Error getting token stats: {e}")
+        except Exception:
+            logger.exception("Error getting token stats")
             return {"active_tokens": 0, "revoked_tokens": 0, "total_tokens": 0}
     
-    def health_check(self) -> bool:
+    async def close(self) -> None:
+        """Stop the revocation listener and close pooled connections"""
+        if self._revoked_listener is not None:
+            self._revoked_listener.cancel()
+            try:
+                await self._revoked_listener
+            except asyncio.CancelledError:
+                pass
+            self._revoked_listener = None
+        await self.redis_client.aclose()
+        await self._pool.disconnect()
+    
+    async def health_check(self) -> bool:
         """Check if Redis connection is healthy"""
         try:
-            self.redis_client.ping()
+            await self.redis_client.ping()
             return True
         except Exception:
             return False
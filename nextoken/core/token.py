@@ -2,199 +2,499 @@
 Core token operations for NexToken
 """
 
-import uuid
+import os
 import time
-import base64
-from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, Tuple
+import asyncio
+import hashlib
+import logging
+import binascii
+import threading
+from typing import Dict, Any, List, Optional, Tuple
 import cbor2
+from cachetools import TTLCache
 
 from .crypto import crypto_manager
 from .storage import token_storage
 
+logger = logging.getLogger(__name__)
+
+try:
+    import _cbor2  # noqa: F401
+except ImportError:
+    logger.warning("cbor2 C extension is unavailable; token encoding uses the pure-Python fallback")
+
+TOKEN_VERSION = "1.0"
+TOKEN_ALGORITHM = "Ed25519"
+
+# Successful verify results, keyed by a digest of the token string. Expiry and
+# revocation are re-checked on every hit, so the TTL only bounds how long idle
+# entries stay
+RESULT_CACHE_SIZE = 100_000
+RESULT_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", "60"))
+
+# Ed25519 signatures are always 64 bytes, so the frame needs no length prefix
+SIGNATURE_SIZE = 64
+
+# Claims are checked before the signature, so verify failures share one error
+# instead of revealing which unauthenticated check failed
+INVALID_TOKEN_ERROR = "Invalid token"
+
+# The header is identical for every token, so the CBOR bytes for
+# {"header": {...}, "payload": are encoded once and the payload appended per token
+_TOKEN_DATA_PREFIX = (
+    b"\xa2"  # map with 2 entries
+    + cbor2.dumps("header")
+    + cbor2.dumps({"alg": TOKEN_ALGORITHM, "typ": "NexToken", "ver": TOKEN_VERSION})
+    + cbor2.dumps("payload")
+)
+
+
+# Translation tables between the standard and URL-safe base64 alphabets
+_B64_TO_URLSAFE = bytes.maketrans(b"+/", b"-_")
+_URLSAFE_TO_B64 = bytes.maketrans(b"-_", b"+/")
+
+
+def _b64encode(data: bytes) -> str:
+    """Encode bytes as a base64url string"""
+    return binascii.b2a_base64(data, newline=False).translate(_B64_TO_URLSAFE).decode('ascii')
+
+
+def unix_now() -> int:
+    """Current time in whole Unix seconds, without a float round trip"""
+    return time.time_ns() // 1_000_000_000
+
+
+def _cache_key(token_string: str) -> bytes:
+    """Result cache key; a short digest so cached entries never hold bearer tokens"""
+    return hashlib.blake2b(token_string.encode(), digest_size=16).digest()
+
+
+def _freeze_result(result: Dict[str, Any], exp_time: int) -> Tuple[Dict[str, Any], int, Optional[bytes]]:
+    """Result cache entry; container claims are kept as CBOR so no caller shares them with the cache"""
+    claims = result["custom_claims"]
+    if isinstance(claims, (dict, list)):
+        return dict(result, custom_claims=None), exp_time, cbor2.dumps(claims)
+    return result, exp_time, None
+
+
+def _thaw_result(result: Dict[str, Any], claims_cbor: Optional[bytes]) -> Dict[str, Any]:
+    """Fresh verify result from a result cache entry"""
+    result = dict(result)
+    if claims_cbor is not None:
+        result["custom_claims"] = cbor2.loads(claims_cbor)
+    return result
+
+
+def _b64decode(token_string: str) -> bytes:
+    """Decode a base64url string; non-ASCII input raises ValueError"""
+    return binascii.a2b_base64(token_string.encode('ascii').translate(_URLSAFE_TO_B64))
+
 
 class NexToken:
     """NexToken implementation with CBOR format and Ed25519 signatures"""
     
     def __init__(self):
-        self.version = "1.0"
-        self.algorithm = "Ed25519"
+        self.version = TOKEN_VERSION
+        self.algorithm = TOKEN_ALGORITHM
+        self._result_cache: TTLCache = TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+        # TTLCache expires entries on reads too, so every access takes the lock
+        self._result_cache_lock = threading.Lock()
     
-    def create_token(
+    def _encode_tokens(
+        self,
+        specs: List[Dict[str, Any]],
+        now: int
+    ) -> List[Tuple[str, str, Dict[str, Any], int]]:
+        """
+        Build and sign NexTokens without storing them
+        
+        Args:
+            specs: Per-token fields as accepted by create_token
+                (user_id, and optionally email, expires_in, custom_claims)
+            now: Issue time in Unix seconds
+        
+        Returns:
+            List of (token_string, token_id, metadata, expires_in) in the same
+            order as specs
+        """
+        # Bind per-token lookups once, outside the loop
+        urandom = os.urandom
+        b64encode = _b64encode
+        dumps = cbor2.dumps
+        sign = crypto_manager.sign_data
+        encrypt = crypto_manager.encrypt_field
+        prefix = _TOKEN_DATA_PREFIX
+        encoded = []
+        
+        for spec in specs:
+            user_id = spec["user_id"]
+            email = spec.get("email")
+            expires_in = spec.get("expires_in", 3600)
+            custom_claims = spec.get("custom_claims")
+            
+            # Generate unique token ID (128 random bits, unpadded base64url)
+            token_id = b64encode(urandom(16)).rstrip("=")
+            
+            # Calculate timestamps
+            expires_at = now + expires_in
+            
+            # Create payload
+            payload = {
+                "jti": token_id,  # JWT ID (token ID)
+                "sub": user_id,   # Subject (user ID)
+                "iat": now,       # Issued at
+                "exp": expires_at, # Expires at
+                "nbf": now        # Not before
+            }
+            
+            # Add encrypted email if provided
+            if email:
+                payload["email_enc"] = encrypt(email)
+            
+            # Add custom claims; any JSON value except null, including falsy ones
+            if custom_claims is not None:
+                payload["custom"] = custom_claims
+            
+            # Encode to CBOR behind the pre-encoded header, then sign
+            cbor_data = prefix + dumps(payload)
+            signature = sign(cbor_data)
+            
+            # Frame the token as cbor_data || signature and base64 encode it
+            token_string = b64encode(cbor_data + signature)
+            
+            metadata = {
+                "user_id": user_id,
+                "email": email,
+                "issued_at": now,
+                "expires_at": expires_at,
+                "custom_claims": custom_claims
+            }
+            
+            encoded.append((token_string, token_id, metadata, expires_in))
+        
+        return encoded
+    
+    async def create_token(
         self,
         user_id: str,
         email: Optional[str] = None,
         expires_in: int = 3600,
-        custom_claims: Optional[Dict[str, Any]] = None
+        custom_claims: Optional[Any] = None,
+        now: Optional[int] = None
     ) -> Tuple[str, str]:
         """
         Create a new NexToken
         
+        Args:
+            now: Issue time in Unix seconds; read from the clock when omitted
+        
         Returns:
             Tuple of (token_string, token_id)
+        
+        Raises:
+            RuntimeError: If the token metadata could not be stored
         """
-        # Generate unique token ID
-        token_id = str(uuid.uuid4())
+        if now is None:
+            now = unix_now()
         
-        # Calculate timestamps
-        now = int(time.time())
-        expires_at = now + expires_in
+        (token_string, token_id, metadata, _), = self._encode_tokens([{
+            "user_id": user_id,
+            "email": email,
+            "expires_in": expires_in,
+            "custom_claims": custom_claims
+        }], now)
         
-        # Create header
-        header = {
-            "alg": self.algorithm,
-            "typ": "NexToken",
-            "ver": self.version
-        }
+        # Store token metadata in Redis; a token without it is never handed out
+        if not await token_storage.store_token_metadata(token_id, metadata, expires_in):
+            raise RuntimeError("Failed to store token metadata")
         
-        # Create payload
-        payload = {
-            "jti": token_id,  # JWT ID (token ID)
-            "sub": user_id,   # Subject (user ID)
-            "iat": now,       # Issued at
-            "exp": expires_at, # Expires at
-            "nbf": now        # Not before
-        }
+        return token_string, token_id
+    
+    async def create_tokens_bulk(
+        self,
+        specs: List[Dict[str, Any]],
+        now: Optional[int] = None
+    ) -> List[Tuple[str, str]]:
+        """
+        Create many NexTokens, storing their metadata in one Redis round trip
         
-        # Add encrypted email if provided
-        if email:
-            encrypted_email = crypto_manager.encrypt_field(email)
-            payload["email_enc"] = encrypted_email
+        Args:
+            specs: Per-token keyword arguments as accepted by create_token
+                (user_id, and optionally email, expires_in, custom_claims)
+            now: Issue time in Unix seconds; read from the clock when omitted
         
-        # Add custom claims
-        if custom_claims:
-            payload["custom"] = custom_claims
+        Returns:
+            List of (token_string, token_id) in the same order as specs
         
-        # Create token data structure
-        token_data = {
-            "header": header,
-            "payload": payload
-        }
+        Raises:
+            RuntimeError: If the token metadata could not be stored
+        """
+        if now is None:
+            now = unix_now()
         
-        # Encode to CBOR
-        cbor_data = cbor2.dumps(token_data)
+        encoded = self._encode_tokens(specs, now)
+        entries = [(token_id, metadata, expires_in) for _, token_id, metadata, expires_in in encoded]
         
-        # Sign the CBOR data
-        signature = crypto_manager.sign_data(cbor_data)
+        # Store all token metadata in Redis; a token without it is never handed out
+        if not await token_storage.store_tokens_metadata(entries):
+            raise RuntimeError("Failed to store token metadata")
         
-        # Create final token structure
-        final_token = {
-            "data": cbor_data,
-            "signature": signature
-        }
+        return [(token_string, token_id) for token_string, token_id, _, _ in encoded]
+    
+    def _decode_token(self, token_string: str) -> Tuple[Dict[str, Any], bytes, bytes]:
+        """
+        Split a NexToken into its payload, signed data and signature
         
-        # Encode final token to CBOR and then base64
-        final_cbor = cbor2.dumps(final_token)
-        token_string = base64.urlsafe_b64encode(final_cbor).decode('utf-8')
+        The signature is not checked here.
         
-        # Store token metadata in Redis
-        metadata = {
-            "user_id": user_id,
+        Returns:
+            Tuple of (payload, cbor_data, signature)
+        
+        Raises:
+            ValueError: If the token is malformed or uses another algorithm
+        """
+        # Decode from base64
+        token_bytes = _b64decode(token_string)
+        
+        if len(token_bytes) <= SIGNATURE_SIZE:
+            raise ValueError("Malformed token")
+        
+        # Split data and signature
+        cbor_data = token_bytes[:-SIGNATURE_SIZE]
+        signature = token_bytes[-SIGNATURE_SIZE:]
+        
+        # Decode token data
+        token_data = cbor2.loads(cbor_data)
+        if not isinstance(token_data, dict):
+            raise ValueError("Malformed token")
+        header = token_data.get("header")
+        payload = token_data.get("payload")
+        if not isinstance(header, dict) or not isinstance(payload, dict):
+            raise ValueError("Malformed token")
+        
+        # Verify algorithm
+        if header.get("alg") != self.algorithm:
+            raise ValueError("Unsupported algorithm")
+        
+        return payload, cbor_data, signature
+    
+    def _check_claims(self, payload: Dict[str, Any], current_time: int) -> Tuple[Optional[Dict[str, Any]], int]:
+        """
+        Check the token ID and time-based claims of a decoded payload
+        
+        Returns:
+            Tuple of (failure result or None, expiry time in Unix seconds)
+        """
+        token_id = payload.get("jti")
+        exp_time = payload.get("exp", 0)
+        nbf_time = payload.get("nbf", 0)
+        
+        # Token ID present, integer times, not expired and not before nbf; the
+        # claims are not authenticated yet, so any failure gets the generic error
+        if not isinstance(token_id, str) or not token_id \
+                or not isinstance(exp_time, int) or not isinstance(nbf_time, int) \
+                or not nbf_time <= current_time <= exp_time:
+            return {
+                "valid": False,
+                "error": INVALID_TOKEN_ERROR
+            }, 0
+        
+        return None, exp_time
+    
+    def _build_result(self, payload: Dict[str, Any], exp_time: int) -> Dict[str, Any]:
+        """Build the verification result for a payload whose checks passed"""
+        # Decrypt email if present
+        email = None
+        if "email_enc" in payload:
+            encrypted_email = payload["email_enc"]
+            email = crypto_manager.decrypt_field(encrypted_email)
+        
+        return {
+            "valid": True,
+            "user_id": payload.get("sub"),
             "email": email,
-            "issued_at": now,
-            "expires_at": expires_at,
-            "custom_claims": custom_claims
+            "custom_claims": payload.get("custom"),
+            "expires_at": exp_time,
+            "issued_at": payload.get("iat", 0),
+            "token_id": payload["jti"]
         }
-        token_storage.store_token_metadata(token_id, metadata, expires_in)
+    
+    def _check_token(self, token_string: str, current_time: int) -> Tuple[Dict[str, Any], int]:
+        """
+        Decode a NexToken and check everything except revocation
         
-        return token_string, token_id
+        Returns:
+            Tuple of (verification result, expiry time in Unix seconds)
+        """
+        # Decode token data; cheap claim checks run before the signature
+        # check so expired or malformed tokens never reach the curve operation
+        payload, cbor_data, signature = self._decode_token(token_string)
+        
+        failure, exp_time = self._check_claims(payload, current_time)
+        if failure is not None:
+            return failure, exp_time
+        
+        # Verify signature
+        if not crypto_manager.verify_signature(cbor_data, signature):
+            return {
+                "valid": False,
+                "error": INVALID_TOKEN_ERROR
+            }, exp_time
+        
+        return self._build_result(payload, exp_time), exp_time
     
-    def verify_token(self, token_string: str) -> Dict[str, Any]:
+    async def verify_token(self, token_string: str, now: Optional[int] = None) -> Dict[str, Any]:
         """
         Verify and decode a NexToken
         
+        Args:
+            now: Verification time in Unix seconds; read from the clock when omitted
+        
         Returns:
             Dictionary with verification results
         """
         try:
-            # Decode from base64
-            token_bytes = base64.urlsafe_b64decode(token_string.encode('utf-8'))
-            
-            # Decode CBOR
-            final_token = cbor2.loads(token_bytes)
+            current_time = unix_now() if now is None else now
             
-            # Extract data and signature
-            cbor_data = final_token["data"]
-            signature = final_token["signature"]
+            # Repeat verifies of a known-good token skip decoding and the
+            # signature check; expiry and revocation are checked every time
+            cache_key = _cache_key(token_string)
+            with self._result_cache_lock:
+                cached = self._result_cache.get(cache_key)
+            if cached is None:
+                result, exp_time = self._check_token(token_string, current_time)
+                if not result["valid"]:
+                    return result
+            else:
+                result, exp_time, claims_cbor = cached
+                if current_time > exp_time:
+                    return {
+                        "valid": False,
+                        "error": INVALID_TOKEN_ERROR
+                    }
             
-            # Verify signature
-            if not crypto_manager.verify_signature(cbor_data, signature):
+            # Check if token is revoked (network round trip, so done last)
+            if await token_storage.is_token_revoked(result["token_id"]):
+                with self._result_cache_lock:
+                    self._result_cache.pop(cache_key, None)
                 return {
                     "valid": False,
-                    "error": "Invalid signature"
+                    "error": "Token has been revoked"
                 }
             
-            # Decode token data
-            token_data = cbor2.loads(cbor_data)
-            header = token_data["header"]
-            payload = token_data["payload"]
+            if cached is not None:
+                return _thaw_result(result, claims_cbor)
             
-            # Verify algorithm
-            if header.get("alg") != self.algorithm:
-                return {
-                    "valid": False,
-                    "error": "Unsupported algorithm"
-                }
+            with self._result_cache_lock:
+                self._result_cache[cache_key] = _freeze_result(result, exp_time)
+            return dict(result)
             
-            # Check token ID
-            token_id = payload.get("jti")
-            if not token_id:
-                return {
+        except Exception:
+            # Undecodable tokens get the generic error too, without the
+            # exception text
+            return {
+                "valid": False,
+                "error": INVALID_TOKEN_ERROR
+            }
+    
+    async def verify_tokens(self, token_strings: List[str], now: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Verify many NexTokens at once
+        
+        Signature checks for the whole batch run in one worker thread, then
+        a single Redis round trip fetches the revocation flags of the tokens
+        that passed.
+        
+        Args:
+            now: Verification time in Unix seconds; read from the clock when omitted
+        
+        Returns:
+            List of verification results, in the order of token_strings
+        """
+        current_time = unix_now() if now is None else now
+        results: List[Optional[Dict[str, Any]]] = [None] * len(token_strings)
+        cache_keys = [_cache_key(token_string) for token_string in token_strings]
+        cached_hits = []
+        pending = []
+        
+        with self._result_cache_lock:
+            cached_results = [self._result_cache.get(cache_key) for cache_key in cache_keys]
+        
+        for i, (token_string, cached) in enumerate(zip(token_strings, cached_results)):
+            try:
+                if cached is not None:
+                    result, exp_time, claims_cbor = cached
+                    if current_time > exp_time:
+                        results[i] = {
+                            "valid": False,
+                            "error": INVALID_TOKEN_ERROR
+                        }
+                    else:
+                        cached_hits.append((i, result, claims_cbor))
+                    continue
+                
+                payload, cbor_data, signature = self._decode_token(token_string)
+                failure, exp_time = self._check_claims(payload, current_time)
+                if failure is not None:
+                    results[i] = failure
+                else:
+                    pending.append((i, payload, exp_time, cbor_data, signature))
+            except Exception:
+                results[i] = {
                     "valid": False,
-                    "error": "Missing token ID"
+                    "error": INVALID_TOKEN_ERROR
                 }
-            
-            # Check if token is revoked
-            if token_storage.is_token_revoked(token_id):
-                return {
+        
+        verify_signature = crypto_manager.verify_signature
+        
+        # run_in_executor rather than asyncio.to_thread keeps Python 3.8 support
+        loop = asyncio.get_running_loop()
+        signatures_ok = await loop.run_in_executor(
+            None,
+            lambda: [verify_signature(cbor_data, signature) for _, _, _, cbor_data, signature in pending]
+        )
+        
+        # Only authenticated token IDs reach Redis
+        verified = []
+        for entry, signature_ok in zip(pending, signatures_ok):
+            if signature_ok:
+                verified.append(entry)
+            else:
+                results[entry[0]] = {
                     "valid": False,
-                    "error": "Token has been revoked"
+                    "error": INVALID_TOKEN_ERROR
                 }
-            
-            # Check expiration
-            current_time = int(time.time())
-            exp_time = payload.get("exp", 0)
-            
-            if current_time > exp_time:
-                return {
+        
+        token_ids = [result["token_id"] for _, result, _ in cached_hits]
+        token_ids.extend(payload["jti"] for _, payload, _, _, _ in verified)
+        revoked = await token_storage.are_tokens_revoked(token_ids) if token_ids else []
+        
+        for (i, result, claims_cbor), is_revoked in zip(cached_hits, revoked):
+            if is_revoked:
+                with self._result_cache_lock:
+                    self._result_cache.pop(cache_keys[i], None)
+                results[i] = {
                     "valid": False,
-                    "error": "Token has expired"
+                    "error": "Token has been revoked"
                 }
-            
-            # Check not before
-            nbf_time = payload.get("nbf", 0)
-            if current_time < nbf_time:
-                return {
+            else:
+                results[i] = _thaw_result(result, claims_cbor)
+        
+        for (i, payload, exp_time, _, _), is_revoked in zip(verified, revoked[len(cached_hits):]):
+            if is_revoked:
+                results[i] = {
                     "valid": False,
-                    "error": "Token not yet valid"
+                    "error": "Token has been revoked"
                 }
-            
-            # Decrypt email if present
-            email = None
-            if "email_enc" in payload:
-                encrypted_email = payload["email_enc"]
-                email = crypto_manager.decrypt_field(encrypted_email)
-            
-            # Prepare response
-            result = {
-                "valid": True,
-                "user_id": payload.get("sub"),
-                "email": email,
-                "custom_claims": payload.get("custom"),
-                "expires_at": datetime.fromtimestamp(exp_time),
-                "issued_at": datetime.fromtimestamp(payload.get("iat", 0)),
-                "token_id": token_id
-            }
-            
-            return result
-            
-        except Exception as e:
-            return {
-                "valid": False,
-                "error": f"Token verification failed: {str(e)}"
-            }
+            else:
+                result = self._build_result(payload, exp_time)
+                with self._result_cache_lock:
+                    self._result_cache[cache_keys[i]] = _freeze_result(result, exp_time)
+                results[i] = dict(result)
+        
+        return results
     
-    def revoke_token(self, token_string: str) -> Dict[str, Any]:
+    async def revoke_token(self, token_string: str) -> Dict[str, Any]:
         """
         Revoke a NexToken
         
@@ -202,16 +502,23 @@ class NexToken:
             Dictionary with revocation results
         """
         try:
-            # First verify the token to get the token ID
-            verification_result = self.verify_token(token_string)
+            # Decode once and check the signature; expiry and revocation
+            # status do not matter for revoking
+            try:
+                payload, cbor_data, signature = self._decode_token(token_string)
+            except Exception as e:
+                return {
+                    "success": False,
+                    "message": f"Cannot revoke invalid token: decode error: {str(e)}"
+                }
             
-            if not verification_result["valid"]:
+            if not crypto_manager.verify_signature(cbor_data, signature):
                 return {
                     "success": False,
-                    "message": f"Cannot revoke invalid token: {verification_result.get('error', 'Unknown error')}"
+                    "message": "Cannot revoke invalid token: Invalid signature"
                 }
             
-            token_id = verification_result.get("token_id")
+            token_id = payload.get("jti")
             if not token_id:
                 return {
                     "success": False,
@@ -219,7 +526,9 @@ class NexToken:
                 }
             
             # Revoke the token
-            if token_storage.revoke_token(token_id):
+            with self._result_cache_lock:
+                self._result_cache.pop(_cache_key(token_string), None)
+            if await token_storage.revoke_token(token_id):
                 return {
                     "success": True,
                     "message": "Token successfully revoked"
@@ -2,21 +2,66 @@
 Main FastAPI application for NexToken
 """
 
+from contextlib import asynccontextmanager
+from logging.handlers import QueueHandler, QueueListener
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response
+import os
 import time
+import orjson
+import queue
+import logging
+from typing import Tuple
 
 from .api.endpoints import router
+from .core.storage import token_storage
+from .core.token import unix_now
 from . import __version__
 
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Static documentation routes that do not get an X-Process-Time header
+UNTIMED_PATHS = frozenset({"/docs", "/redoc", "/openapi.json"})
+
+
+def start_log_listener() -> Tuple[QueueListener, QueueHandler]:
+    """Route nextoken log records through a queue so handler I/O runs off the event loop"""
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    
+    package_logger = logging.getLogger("nextoken")
+    package_logger.setLevel(os.getenv("NEXTOKEN_LOG_LEVEL", "INFO").upper())
+    queue_handler = QueueHandler(log_queue)
+    package_logger.addHandler(queue_handler)
+    package_logger.propagate = False
+    
+    listener.start()
+    return listener, queue_handler
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start queued logging, and release pooled Redis connections on shutdown"""
+    log_listener, queue_handler = start_log_listener()
+    yield
+    await token_storage.close()
+    logging.getLogger("nextoken").removeHandler(queue_handler)
+    log_listener.stop()
+
+
 # Create FastAPI app
 app = FastAPI(
     title="NexToken API",
     description="A modern, secure authentication token system",
     version=__version__,
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -31,23 +76,25 @@ app.add_middleware(
 
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
-    """Add processing time header to responses"""
-    start_time = time.time()
+    """Add processing time header (integer nanoseconds) to API responses"""
+    if request.url.path in UNTIMED_PATHS:
+        return await call_next(request)
+    
+    start_time = time.perf_counter_ns()
     response = await call_next(request)
-    process_time = time.time() - start_time
-    response.headers["X-Process-Time"] = str(process_time)
+    response.headers["X-Process-Time"] = str(time.perf_counter_ns() - start_time)
     return response
 
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Global exception handler"""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "error": "Internal server error",
             "detail": str(exc),
-            "timestamp": time.time()
+            "timestamp": unix_now()
         }
     )
 
@@ -56,46 +103,55 @@ async def global_exception_handler(request: Request, exc: Exception):
 app.include_router(router, prefix="/api/v1", tags=["tokens"])
 
 
+# Static payloads for the root and info endpoints, encoded once at import
+ROOT_CONTENT = orjson.dumps({
+    "name": "NexToken API",
+    "version": __version__,
+    "description": "A modern, secure authentication token system",
+    "docs": "/docs",
+    "health": "/api/v1/health"
+})
+
+INFO_CONTENT = orjson.dumps({
+    "name": "NexToken",
+    "version": __version__,
+    "description": "A modern, secure authentication token system that improves upon JWT",
+    "features": [
+        "Ed25519 elliptic curve signatures",
+        "CBOR compact binary format",
+        "Dynamic token revocation",
+        "Encrypted payload fields",
+        "Redis-based storage"
+    ],
+    "endpoints": {
+        "issue": "POST /api/v1/issue",
+        "issue_bulk": "POST /api/v1/issue_bulk",
+        "verify": "POST /api/v1/verify", 
+        "verify_bulk": "POST /api/v1/verify_bulk",
+        "revoke": "POST /api/v1/revoke",
+        "health": "GET /api/v1/health",
+        "stats": "GET /api/v1/stats"
+    },
+    "documentation": {
+        "swagger": "/docs",
+        "redoc": "/redoc"
+    }
+})
+
+
 @app.get("/", tags=["root"])
 async def root():
     """Root endpoint with API information"""
-    return {
-        "name": "NexToken API",
-        "version": __version__,
-        "description": "A modern, secure authentication token system",
-        "docs": "/docs",
-        "health": "/api/v1/health"
-    }
+    return Response(content=ROOT_CONTENT, media_type="application/json")
 
 
 @app.get("/info", tags=["info"])
 async def info():
     """Detailed API information"""
-    return {
-        "name": "NexToken",
-        "version": __version__,
-        "description": "A modern, secure authentication token system that improves upon JWT",
-        "features": [
-            "Ed25519 elliptic curve signatures",
-            "CBOR compact binary format",
-            "Dynamic token revocation",
-            "Encrypted payload fields",
-            "Redis-based storage"
-        ],
-        "endpoints": {
-            "issue": "POST /api/v1/issue",
-            "verify": "POST /api/v1/verify", 
-            "revoke": "POST /api/v1/revoke",
-            "health": "GET /api/v1/health",
-            "stats": "GET /api/v1/stats"
-        },
-        "documentation": {
-            "swagger": "/docs",
-            "redoc": "/redoc"
-        }
-    }
+    return Response(content=INFO_CONTENT, media_type="application/json")
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    # "auto" picks the uvloop event loop and httptools parser when installed
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="auto", http="auto") 
\ No newline at end of file
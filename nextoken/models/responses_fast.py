@@ -0,0 +1,51 @@
+"""
+msgspec response structs for NexToken API
+
+These mirror the Pydantic response models in schemas.py field for field.
+The Pydantic models stay as the documented response_model for OpenAPI,
+while the endpoints build and encode these structs on the hot path.
+"""
+
+import msgspec
+from typing import Optional, Any, List
+
+
+class TokenIssueResponse(msgspec.Struct, frozen=True, gc=False):
+    """Response struct for token issuance"""
+    token: str
+    token_id: str
+    expires_at: int
+
+
+class TokenIssueBulkResponse(msgspec.Struct, frozen=True, gc=False):
+    """Response struct for bulk token issuance"""
+    tokens: List[TokenIssueResponse]
+
+
+class TokenVerifyResponse(msgspec.Struct, frozen=True, gc=False):
+    """Response struct for token verification"""
+    valid: bool
+    user_id: Optional[str] = None
+    email: Optional[str] = None
+    custom_claims: Optional[Any] = None
+    expires_at: Optional[int] = None
+    issued_at: Optional[int] = None
+    error: Optional[str] = None
+
+
+class TokenVerifyBulkResponse(msgspec.Struct, frozen=True, gc=False):
+    """Response struct for bulk token verification"""
+    results: List[TokenVerifyResponse]
+
+
+class TokenRevokeResponse(msgspec.Struct, frozen=True, gc=False):
+    """Response struct for token revocation"""
+    success: bool
+    message: str
+
+
+class HealthResponse(msgspec.Struct, frozen=True, gc=False):
+    """Response struct for health check"""
+    status: str
+    version: str
+    timestamp: int
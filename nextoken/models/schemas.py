@@ -2,24 +2,45 @@
 Pydantic schemas for NexToken API
 """
 
-from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
-from datetime import datetime
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional, Any, List
+
+# Upper bound on tokens issued by a single bulk request
+MAX_BULK_TOKENS = 1000
+
+# Response models are built once from trusted values and serialized straight away
+RESPONSE_CONFIG = ConfigDict(frozen=True, extra="forbid")
 
 
 class TokenIssueRequest(BaseModel):
     """Request model for token issuance"""
     user_id: str = Field(..., description="User identifier")
     email: Optional[str] = Field(None, description="User email (will be encrypted)")
-    expires_in: int = Field(3600, description="Token expiration time in seconds")
-    custom_claims: Optional[Dict[str, Any]] = Field(None, description="Additional custom claims")
+    expires_in: int = Field(3600, gt=0, description="Token expiration time in seconds")
+    custom_claims: Optional[Any] = Field(None, description="Additional custom claims (opaque JSON, embedded as-is)")
 
 
 class TokenIssueResponse(BaseModel):
     """Response model for token issuance"""
+    model_config = RESPONSE_CONFIG
+    
     token: str = Field(..., description="The generated NexToken")
     token_id: str = Field(..., description="Unique token identifier")
-    expires_at: datetime = Field(..., description="Token expiration timestamp")
+    expires_at: int = Field(..., description="Token expiration time (Unix seconds)")
+
+
+class TokenIssueBulkRequest(BaseModel):
+    """Request model for bulk token issuance"""
+    tokens: List[TokenIssueRequest] = Field(
+        ..., min_length=1, max_length=MAX_BULK_TOKENS, description="Tokens to issue"
+    )
+
+
+class TokenIssueBulkResponse(BaseModel):
+    """Response model for bulk token issuance"""
+    model_config = RESPONSE_CONFIG
+    
+    tokens: List[TokenIssueResponse] = Field(..., description="Issued tokens, in request order")
 
 
 class TokenVerifyRequest(BaseModel):
@@ -29,15 +50,31 @@ class TokenVerifyRequest(BaseModel):
 
 class TokenVerifyResponse(BaseModel):
     """Response model for token verification"""
+    model_config = RESPONSE_CONFIG
+    
     valid: bool = Field(..., description="Whether the token is valid")
     user_id: Optional[str] = Field(None, description="User identifier from token")
     email: Optional[str] = Field(None, description="User email (if provided and decrypted)")
-    custom_claims: Optional[Dict[str, Any]] = Field(None, description="Custom claims from token")
-    expires_at: Optional[datetime] = Field(None, description="Token expiration timestamp")
-    issued_at: Optional[datetime] = Field(None, description="Token issuance timestamp")
+    custom_claims: Optional[Any] = Field(None, description="Custom claims from token")
+    expires_at: Optional[int] = Field(None, description="Token expiration time (Unix seconds)")
+    issued_at: Optional[int] = Field(None, description="Token issuance time (Unix seconds)")
     error: Optional[str] = Field(None, description="Error message if token is invalid")
 
 
+class TokenVerifyBulkRequest(BaseModel):
+    """Request model for bulk token verification"""
+    tokens: List[str] = Field(
+        ..., min_length=1, max_length=MAX_BULK_TOKENS, description="NexTokens to verify"
+    )
+
+
+class TokenVerifyBulkResponse(BaseModel):
+    """Response model for bulk token verification"""
+    model_config = RESPONSE_CONFIG
+    
+    results: List[TokenVerifyResponse] = Field(..., description="Verification results, in request order")
+
+
 class TokenRevokeRequest(BaseModel):
     """Request model for token revocation"""
     token: str = Field(..., description="The NexToken to revoke")
@@ -45,12 +82,16 @@ class TokenRevokeRequest(BaseModel):
 
 class TokenRevokeResponse(BaseModel):
     """Response model for token revocation"""
+    model_config = RESPONSE_CONFIG
+    
     success: bool = Field(..., description="Whether the token was successfully revoked")
     message: str = Field(..., description="Response message")
 
 
 class HealthResponse(BaseModel):
     """Response model for health check"""
+    model_config = RESPONSE_CONFIG
+    
     status: str = Field(..., description="Service status")
     version: str = Field(..., description="NexToken version")
-    timestamp: datetime = Field(..., description="Current timestamp") 
\ No newline at end of file
+    timestamp: int = Field(..., description="Current time (Unix seconds)") 
\ No newline at end of file
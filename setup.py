@@ -39,6 +39,7 @@ setup(
         "dev": [
             "pytest>=7.0.0",
             "pytest-asyncio>=0.21.0",
+            "pytest-xdist>=3.0.0",
             "black>=22.0.0",
             "flake8>=4.0.0",
             "mypy>=0.950",
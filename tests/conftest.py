@@ -0,0 +1,14 @@
+"""
+Shared pytest fixtures for NexToken
+"""
+
+import asyncio
+import pytest
+
+
+@pytest.fixture(scope="session")
+def event_loop():
+    """Share one event loop so the pooled async Redis connections stay usable"""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
@@ -0,0 +1,73 @@
+"""
+API tests for NexToken request body validation
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from nextoken.main import app
+
+# No lifespan: it would close the shared Redis pool, and these requests fail
+# validation before any endpoint touches Redis
+client = TestClient(app)
+
+
+class TestRequestValidation:
+    """Test that malformed request bodies are rejected with 422"""
+    
+    def test_invalid_json(self):
+        """Test a body that is not JSON"""
+        response = client.post("/api/v1/verify", content=b'{"token": ')
+        assert response.status_code == 422
+        error = response.json()["detail"][0]
+        assert error["type"] == "json_invalid"
+        assert error["loc"] == ["body"]
+        assert error["input"] == {}
+    
+    def test_non_utf8_body(self):
+        """Test a body that is not valid UTF-8"""
+        response = client.post("/api/v1/verify", content=b"\xff\xfe")
+        assert response.status_code == 422
+        assert response.json()["detail"][0]["type"] == "json_invalid"
+    
+    @pytest.mark.parametrize("content_type", ["text/plain", "application/x-www-form-urlencoded"])
+    def test_non_json_content_type(self, content_type):
+        """Test that a JSON body sent with a non-JSON content type is not parsed"""
+        response = client.post(
+            "/api/v1/verify", content=b'{"token": "abc"}', headers={"content-type": content_type}
+        )
+        assert response.status_code == 422
+        error = response.json()["detail"][0]
+        assert error["loc"] == ["body"]
+        assert error["input"] == {}
+    
+    def test_json_content_type_variants(self):
+        """Test that application/*+json bodies are parsed as JSON"""
+        response = client.post(
+            "/api/v1/issue", content=b'{"user_id": 5}',
+            headers={"content-type": "application/vnd.api+json; charset=utf-8"}
+        )
+        assert response.status_code == 422
+        assert response.json()["detail"][0]["loc"] == ["body", "user_id"]
+    
+    def test_wrong_field_type(self):
+        """Test a field with the wrong type"""
+        response = client.post("/api/v1/issue", json={"user_id": "test_user", "expires_in": "soon"})
+        assert response.status_code == 422
+        error = response.json()["detail"][0]
+        assert error["loc"] == ["body", "expires_in"]
+        assert error["input"] == "soon"
+    
+    @pytest.mark.parametrize("expires_in", [0, -1])
+    def test_non_positive_expiry(self, expires_in):
+        """Test that tokens cannot be issued already expired"""
+        response = client.post("/api/v1/issue", json={"user_id": "test_user", "expires_in": expires_in})
+        assert response.status_code == 422
+        assert response.json()["detail"][0]["loc"] == ["body", "expires_in"]
+    
+    @pytest.mark.parametrize("path", ["/api/v1/issue_bulk", "/api/v1/verify_bulk"])
+    def test_empty_bulk_list(self, path):
+        """Test a bulk request with no tokens"""
+        response = client.post(path, json={"tokens": []})
+        assert response.status_code == 422
+        assert response.json()["detail"][0]["loc"] == ["body", "tokens"]
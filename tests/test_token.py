@@ -2,21 +2,31 @@
 Unit tests for NexToken
 """
 
+import asyncio
 import pytest
 import time
+import cbor2
 from datetime import datetime, timedelta
 
-from nextoken.core.token import nextoken
+from nextoken.core.token import (
+    nextoken, unix_now, _cache_key, _b64encode, _TOKEN_DATA_PREFIX, SIGNATURE_SIZE, INVALID_TOKEN_ERROR
+)
 from nextoken.core.crypto import crypto_manager
 from nextoken.core.storage import token_storage
 
 
+def forge_token(payload):
+    """Encode a payload as a NexToken with an all-zero signature"""
+    return _b64encode(_TOKEN_DATA_PREFIX + cbor2.dumps(payload) + bytes(SIGNATURE_SIZE))
+
+
 class TestNexToken:
     """Test cases for NexToken functionality"""
     
-    def test_create_token_basic(self):
+    @pytest.mark.asyncio
+    async def test_create_token_basic(self):
         """Test basic token creation"""
-        token_string, token_id = nextoken.create_token(
+        token_string, token_id = await nextoken.create_token(
             user_id="test_user",
             expires_in=3600
         )
@@ -26,9 +36,10 @@ class TestNexToken:
         assert len(token_string) > 0
         assert len(token_id) > 0
     
-    def test_create_token_with_email(self):
+    @pytest.mark.asyncio
+    async def test_create_token_with_email(self):
         """Test token creation with encrypted email"""
-        token_string, token_id = nextoken.create_token(
+        token_string, token_id = await nextoken.create_token(
             user_id="test_user",
             email="test@example.com",
             expires_in=3600
@@ -38,16 +49,17 @@ class TestNexToken:
         assert token_id is not None
         
         # Verify the token
-        result = nextoken.verify_token(token_string)
+        result = await nextoken.verify_token(token_string)
         assert result["valid"] is True
         assert result["user_id"] == "test_user"
         assert result["email"] == "test@example.com"
     
-    def test_create_token_with_custom_claims(self):
+    @pytest.mark.asyncio
+    async def test_create_token_with_custom_claims(self):
         """Test token creation with custom claims"""
         custom_claims = {"role": "admin", "permissions": ["read", "write"]}
         
-        token_string, token_id = nextoken.create_token(
+        token_string, token_id = await nextoken.create_token(
             user_id="test_user",
             custom_claims=custom_claims,
             expires_in=3600
@@ -56,66 +68,116 @@ class TestNexToken:
         assert token_string is not None
         
         # Verify the token
-        result = nextoken.verify_token(token_string)
+        result = await nextoken.verify_token(token_string)
         assert result["valid"] is True
         assert result["user_id"] == "test_user"
         assert result["custom_claims"] == custom_claims
     
-    def test_verify_valid_token(self):
+    @pytest.mark.asyncio
+    async def test_create_tokens_bulk(self):
+        """Test issuing several tokens in one call"""
+        specs = [
+            {"user_id": "bulk_user_0", "email": "bulk0@example.com"},
+            {"user_id": "bulk_user_1", "expires_in": 600, "custom_claims": {"role": "reader"}},
+        ]
+        
+        tokens = await nextoken.create_tokens_bulk(specs)
+        assert len(tokens) == len(specs)
+        
+        for (token_string, token_id), spec in zip(tokens, specs):
+            result = await nextoken.verify_token(token_string)
+            assert result["valid"] is True
+            assert result["token_id"] == token_id
+            assert result["user_id"] == spec["user_id"]
+            assert result["email"] == spec.get("email")
+            assert result["custom_claims"] == spec.get("custom_claims")
+            
+            metadata = await token_storage.get_token_metadata(token_id)
+            assert metadata is not None
+            assert metadata["user_id"] == spec["user_id"]
+    
+    @pytest.mark.asyncio
+    async def test_verify_valid_token(self):
         """Test verification of a valid token"""
-        token_string, token_id = nextoken.create_token(
+        token_string, token_id = await nextoken.create_token(
             user_id="test_user",
             expires_in=3600
         )
         
-        result = nextoken.verify_token(token_string)
+        result = await nextoken.verify_token(token_string)
         assert result["valid"] is True
         assert result["user_id"] == "test_user"
         assert result["token_id"] == token_id
+        
+        # Repeat verifies are served from the cache, keyed by a token digest
+        assert await nextoken.verify_token(token_string) == result
+        assert _cache_key(token_string) in nextoken._result_cache
+        assert token_string not in nextoken._result_cache
     
-    def test_verify_expired_token(self):
+    @pytest.mark.asyncio
+    async def test_verify_expired_token(self):
         """Test verification of an expired token"""
-        token_string, token_id = nextoken.create_token(
+        now = unix_now()
+        token_string, token_id = await nextoken.create_token(
             user_id="test_user",
-            expires_in=1  # 1 second expiration
+            expires_in=1,  # 1 second expiration
+            now=now
         )
         
-        # Wait for token to expire
-        time.sleep(2)
-        
-        result = nextoken.verify_token(token_string)
+        # Verify as of two seconds later instead of sleeping
+        result = await nextoken.verify_token(token_string, now=now + 2)
         assert result["valid"] is False
-        assert "expired" in result["error"].lower()
+        assert result["error"] == INVALID_TOKEN_ERROR
     
-    def test_verify_invalid_token(self):
+    @pytest.mark.asyncio
+    async def test_verify_invalid_token(self):
         """Test verification of an invalid token"""
-        result = nextoken.verify_token("invalid_token_string")
-        assert result["valid"] is False
-        assert "error" in result
+        result = await nextoken.verify_token("invalid_token_string")
+        assert result == {"valid": False, "error": INVALID_TOKEN_ERROR}
+        
+        # Unauthenticated claim failures do not say which check failed
+        now = unix_now()
+        forged = [
+            forge_token(payload)
+            for payload in ({"jti": "forged", "exp": now - 10, "nbf": now - 20},
+                            {"jti": "forged", "exp": now + 3600, "nbf": now},
+                            {"jti": "x", "exp": "soon"},
+                            ["jti", "exp"])
+        ]
+        forged.append(_b64encode(cbor2.dumps(["header", "payload"]) + bytes(SIGNATURE_SIZE)))
+        for token_string in forged:
+            result = await nextoken.verify_token(token_string, now=now)
+            assert result == {"valid": False, "error": INVALID_TOKEN_ERROR}
+        assert all(
+            result == {"valid": False, "error": INVALID_TOKEN_ERROR}
+            for result in await nextoken.verify_tokens(forged, now=now)
+        )
     
-    def test_revoke_token(self):
+    @pytest.mark.asyncio
+    async def test_revoke_token(self):
         """Test token revocation"""
-        token_string, token_id = nextoken.create_token(
+        token_string, token_id = await nextoken.create_token(
             user_id="test_user",
             expires_in=3600
         )
         
         # Verify token is valid initially
-        result = nextoken.verify_token(token_string)
+        result = await nextoken.verify_token(token_string)
         assert result["valid"] is True
         
         # Revoke the token
-        revoke_result = nextoken.revoke_token(token_string)
+        revoke_result = await nextoken.revoke_token(token_string)
         assert revoke_result["success"] is True
         
         # Verify token is now invalid
-        result = nextoken.verify_token(token_string)
+        result = await nextoken.verify_token(token_string)
         assert result["valid"] is False
         assert "revoked" in result["error"].lower()
     
-    def test_revoke_invalid_token(self):
+    @pytest.mark.asyncio
+    async def test_revoke_invalid_token(self):
         """Test revoking an invalid token"""
-        result = nextoken.revoke_token("invalid_token")
+        result = await nextoken.revoke_token("invalid_token")
         assert result["success"] is False
         assert "error" in result["message"]
     
@@ -137,83 +199,231 @@ class TestNexToken:
         # Test invalid signature
         assert crypto_manager.verify_signature(test_data, b"invalid_signature") is False
     
-    def test_storage_operations(self):
+    @pytest.mark.asyncio
+    async def test_storage_operations(self):
         """Test storage operations"""
         # Test storing and retrieving metadata
         token_id = "test_token_123"
+        now = unix_now()
         metadata = {
             "user_id": "test_user",
             "email": "test@example.com",
-            "issued_at": int(time.time()),
-            "expires_at": int(time.time()) + 3600
+            "issued_at": now,
+            "expires_at": now + 3600
         }
         
         # Store metadata
-        success = token_storage.store_token_metadata(token_id, metadata, 3600)
+        success = await token_storage.store_token_metadata(token_id, metadata, 3600)
         assert success is True
         
         # Retrieve metadata
-        retrieved = token_storage.get_token_metadata(token_id)
+        retrieved = await token_storage.get_token_metadata(token_id)
         assert retrieved is not None
         assert retrieved["user_id"] == metadata["user_id"]
         assert retrieved["email"] == metadata["email"]
         
         # Test revocation
-        success = token_storage.revoke_token(token_id)
+        success = await token_storage.revoke_token(token_id)
         assert success is True
         
         # Check if revoked
-        is_revoked = token_storage.is_token_revoked(token_id)
+        is_revoked = await token_storage.is_token_revoked(token_id)
         assert is_revoked is True
     
-    def test_token_structure(self):
+    @pytest.mark.asyncio
+    async def test_revoked_filter(self, monkeypatch):
+        """Test the local revoked-ID filter and its Redis fallback"""
+        suffix = time.time_ns()
+        
+        # Loading subscribes to revocations published by other workers
+        assert await token_storage.is_token_revoked(f"filter_unused_{suffix}") is False
+        assert token_storage._revoked_filter_ready is True
+        other_worker_id = f"filter_other_{suffix}"
+        await token_storage.redis_client.publish(token_storage.revoked_channel, other_worker_id)
+        for _ in range(100):
+            if other_worker_id in token_storage._revoked_filter:
+                break
+            await asyncio.sleep(0.01)
+        assert other_worker_id in token_storage._revoked_filter
+        
+        # A stopped listener marks the filter stale and the next check reloads it
+        listener = token_storage._revoked_listener
+        listener.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await listener
+        assert token_storage._revoked_filter_ready is False
+        assert await token_storage.is_token_revoked(f"filter_unused_{suffix}") is False
+        assert token_storage._revoked_filter_ready is True
+        assert token_storage._revoked_listener is not listener
+        
+        # Without a usable filter every check goes to Redis
+        revoked_id = f"filter_revoked_{suffix}"
+        assert await token_storage.revoke_token(revoked_id) is True
+        
+        async def filter_unavailable():
+            return False
+        
+        monkeypatch.setattr(token_storage, "_revoked_filter_ready", False)
+        monkeypatch.setattr(token_storage, "_load_revoked_filter", filter_unavailable)
+        assert await token_storage.is_token_revoked(revoked_id) is True
+        assert await token_storage.is_token_revoked(f"filter_unused_{suffix}") is False
+        monkeypatch.undo()
+        
+        # A failed load is not retried on every check until the backoff expires
+        subscribe_attempts = []
+        
+        def pubsub_unavailable(**kwargs):
+            subscribe_attempts.append(kwargs)
+            raise ConnectionError("Redis unavailable")
+        
+        monkeypatch.setattr(token_storage, "_revoked_filter_ready", False)
+        monkeypatch.setattr(token_storage.redis_client, "pubsub", pubsub_unavailable)
+        for _ in range(3):
+            assert await token_storage.is_token_revoked(revoked_id) is True
+            assert await token_storage.are_tokens_revoked([revoked_id]) == [True]
+        assert len(subscribe_attempts) == 1
+        
+        monkeypatch.setattr(token_storage, "_revoked_filter_retry_at", 0.0)
+        assert await token_storage.is_token_revoked(revoked_id) is True
+        assert len(subscribe_attempts) == 2
+    
+    @pytest.mark.asyncio
+    async def test_falsy_custom_claims(self):
+        """Test that falsy custom claims are kept rather than dropped"""
+        for custom_claims in (0, False, "", [], {}):
+            token_string, _ = await nextoken.create_token(
+                user_id="test_user",
+                custom_claims=custom_claims
+            )
+            result = await nextoken.verify_token(token_string)
+            assert result["custom_claims"] == custom_claims
+            assert type(result["custom_claims"]) is type(custom_claims)
+    
+    @pytest.mark.asyncio
+    async def test_cached_claims_are_not_shared(self):
+        """Test that mutating returned claims does not change later cache hits"""
+        custom_claims = {"roles": ["reader"], "org": {"id": 1}}
+        token_string, _ = await nextoken.create_token(
+            user_id="test_user",
+            custom_claims=custom_claims
+        )
+        
+        for _ in range(3):
+            for result in (await nextoken.verify_token(token_string),
+                           (await nextoken.verify_tokens([token_string]))[0]):
+                assert result["custom_claims"] == custom_claims
+                result["custom_claims"]["roles"].append("admin")
+                result["custom_claims"]["org"]["id"] = 2
+    
+    @pytest.mark.asyncio
+    async def test_large_integer_claims(self, monkeypatch):
+        """Test that claims beyond 64 bits round-trip and metadata failures surface"""
+        custom_claims = {"n": 2 ** 70, "m": -2 ** 70}
+        token_string, token_id = await nextoken.create_token(
+            user_id="test_user",
+            custom_claims=custom_claims
+        )
+        (bulk_token, bulk_id), = await nextoken.create_tokens_bulk([
+            {"user_id": "test_user", "custom_claims": custom_claims}
+        ])
+        
+        for token, tid in ((token_string, token_id), (bulk_token, bulk_id)):
+            metadata = await token_storage.get_token_metadata(tid)
+            assert metadata["custom_claims"] == custom_claims
+            assert (await nextoken.verify_token(token))["custom_claims"] == custom_claims
+        
+        # A token whose metadata was not stored is never returned
+        async def store_failed(*args):
+            return False
+        
+        monkeypatch.setattr(token_storage, "store_token_metadata", store_failed)
+        monkeypatch.setattr(token_storage, "store_tokens_metadata", store_failed)
+        with pytest.raises(RuntimeError):
+            await nextoken.create_token(user_id="test_user")
+        with pytest.raises(RuntimeError):
+            await nextoken.create_tokens_bulk([{"user_id": "test_user"}])
+    
+    @pytest.mark.asyncio
+    async def test_token_structure(self):
         """Test that tokens have the correct structure"""
-        token_string, token_id = nextoken.create_token(
+        token_string, token_id = await nextoken.create_token(
             user_id="test_user",
             email="test@example.com",
             expires_in=3600
         )
         
         # Verify token structure by decoding
-        result = nextoken.verify_token(token_string)
+        result = await nextoken.verify_token(token_string)
         assert result["valid"] is True
         assert result["user_id"] == "test_user"
         assert result["email"] == "test@example.com"
         assert result["token_id"] == token_id
-        assert result["expires_at"] is not None
-        assert result["issued_at"] is not None
+        assert result["expires_at"] - result["issued_at"] == 3600
     
-    def test_multiple_tokens(self):
+    @pytest.mark.asyncio
+    async def test_multiple_tokens(self):
         """Test creating and managing multiple tokens"""
-        # Create multiple tokens
-        tokens = []
-        for i in range(3):
-            token_string, token_id = nextoken.create_token(
-                user_id=f"user_{i}",
-                email=f"user{i}@example.com",
-                expires_in=3600
-            )
-            tokens.append((token_string, token_id))
+        # Create multiple tokens in one batch
+        tokens = await nextoken.create_tokens_bulk([
+            {"user_id": f"user_{i}", "email": f"user{i}@example.com", "expires_in": 3600}
+            for i in range(3)
+        ])
         
-        # Verify all tokens
-        for token_string, token_id in tokens:
-            result = nextoken.verify_token(token_string)
+        # Verify all tokens in one batch; results match individual verifies
+        token_strings = [token_string for token_string, _ in tokens]
+        results = await nextoken.verify_tokens(token_strings)
+        assert results == await asyncio.gather(*(nextoken.verify_token(t) for t in token_strings))
+        for result, (token_string, token_id) in zip(results, tokens):
             assert result["valid"] is True
             assert result["token_id"] == token_id
         
         # Revoke one token
         token_to_revoke, token_id_to_revoke = tokens[0]
-        revoke_result = nextoken.revoke_token(token_to_revoke)
+        revoke_result = await nextoken.revoke_token(token_to_revoke)
         assert revoke_result["success"] is True
         
         # Verify revoked token is invalid
-        result = nextoken.verify_token(token_to_revoke)
+        result = await nextoken.verify_token(token_to_revoke)
         assert result["valid"] is False
         
         # Verify other tokens are still valid
-        for token_string, token_id in tokens[1:]:
-            result = nextoken.verify_token(token_string)
-            assert result["valid"] is True
+        results = await nextoken.verify_tokens(token_strings)
+        assert results[0] == {"valid": False, "error": "Token has been revoked"}
+        assert all(result["valid"] for result in results[1:])
+    
+    @pytest.mark.asyncio
+    async def test_verify_tokens_with_forged_ids(self, monkeypatch):
+        """Test that forged token IDs in a batch cannot hide revoked tokens"""
+        (revoked_token, _), (valid_token, valid_id) = await nextoken.create_tokens_bulk([
+            {"user_id": "revoked_user"}, {"user_id": "valid_user"}
+        ])
+        assert (await nextoken.revoke_token(revoked_token))["success"] is True
+        
+        now = unix_now()
+        forged = [
+            forge_token({"jti": jti, "exp": now + 3600, "nbf": now})
+            for jti in ([1, 2], b"forged", "forged")
+        ]
+        batch = [revoked_token, *forged, valid_token]
+        
+        async def filter_unavailable():
+            return False
+        
+        # Same answers with the warm filter and with every check going to Redis
+        for filter_ready in (True, False):
+            if not filter_ready:
+                monkeypatch.setattr(token_storage, "_revoked_filter_ready", False)
+                monkeypatch.setattr(token_storage, "_load_revoked_filter", filter_unavailable)
+            
+            results = await nextoken.verify_tokens(batch, now=now)
+            assert results[0] == {"valid": False, "error": "Token has been revoked"}
+            for result in results[1:-1]:
+                assert result == {"valid": False, "error": INVALID_TOKEN_ERROR}
+            assert results[-1]["valid"] is True
+            assert results[-1]["token_id"] == valid_id
+        
+        # Non-string IDs are never looked up and count as revoked
+        assert await token_storage.are_tokens_revoked([[1, 2], b"forged", valid_id]) == [True, True, False]
 
 
 if __name__ == "__main__":